@@ -1,7 +1,20 @@
 from flask import Flask
-from flask import request, abort, render_template
+from flask import request, abort, render_template, jsonify, send_file
+from werkzeug.utils import secure_filename
+import json
+import os
+import shutil
+import tempfile
+
+from job_queue import JobManager
+from tree_chunking_util import CHUNK_FORMAT_VERSION, write_tree_chunks
 
 app = Flask(__name__)
+job_manager = JobManager()
+
+# Trees served in chunks are read from here and split into the chunk cache on first use
+TREE_DIRECTORY = os.path.join(app.root_path, "static", "test")
+CHUNK_DIRECTORY = os.path.join(app.root_path, "cache", "chunks")
 
 @app.route('/')
 def index():
@@ -9,6 +22,96 @@ def index():
         return render_template('form.html')
     else:
         return render_template('index.html','')
-    
+
+
+@app.route('/jobs', methods=["POST"])
+def submit_job():
+    matrix_file = request.files.get("matrixFile")
+    if matrix_file is None or matrix_file.filename == "":
+        abort(400, "No matrixFile uploaded")
+    params = {
+        "n_components": request.form.get("n_components", 50, type=int),
+        "method": request.form.get("method", "ward"),
+    }
+    job_id = job_manager.submit(matrix_file.read(), matrix_file.filename, params)
+    return jsonify(job_manager.status(job_id)), 202
+
+
+@app.route('/jobs/<job_id>', methods=["GET"])
+def job_status(job_id):
+    status = job_manager.status(job_id)
+    if status is None:
+        abort(404)
+    return jsonify(status)
+
+
+@app.route('/jobs/<job_id>', methods=["DELETE"])
+def cancel_job(job_id):
+    if job_manager.status(job_id) is None:
+        abort(404)
+    job_manager.cancel(job_id)
+    return jsonify(job_manager.status(job_id))
+
+
+@app.route('/jobs/<job_id>/result', methods=["GET"])
+def job_result(job_id):
+    if job_manager.status(job_id) is None:
+        abort(404)
+    result_path = job_manager.get_result(job_id)
+    if result_path is None:
+        abort(409, "Job has not completed")
+    return send_file(result_path, mimetype="application/json")
+
+
+def get_chunk_directory(tree_name, version=None):
+    tree_name = secure_filename(tree_name)
+    tree_path = os.path.join(TREE_DIRECTORY, f"{tree_name}.json")
+    if not tree_name or not os.path.exists(tree_path):
+        abort(404)
+
+    if version is not None:
+        # Chunks requested for the version of a manifest the client already holds
+        directory = os.path.join(CHUNK_DIRECTORY, tree_name, secure_filename(version))
+        if not os.path.isdir(directory):
+            abort(404)
+        return directory
+
+    # A new version of the source tree or of the chunk layout gets its own chunk directory
+    stat = os.stat(tree_path)
+    version = f"{CHUNK_FORMAT_VERSION}-{stat.st_mtime_ns}-{stat.st_size}"
+    directory = os.path.join(CHUNK_DIRECTORY, tree_name, version)
+    if not os.path.isdir(directory):
+        os.makedirs(os.path.dirname(directory), exist_ok=True)
+        # Write into a private directory first so concurrent requests never see half a tree
+        temporary_directory = tempfile.mkdtemp(dir=os.path.dirname(directory))
+        with open(tree_path) as f:
+            tree = json.load(f)
+        manifest = write_tree_chunks(tree, temporary_directory)
+        manifest["version"] = version
+        with open(os.path.join(temporary_directory, "manifest.json"), "w") as f:
+            json.dump(manifest, f)
+        try:
+            os.replace(temporary_directory, directory)
+        except OSError:
+            # Another request finished the same version first
+            shutil.rmtree(temporary_directory)
+    return directory
+
+
+@app.route('/trees/<tree_name>/chunks/manifest', methods=["GET"])
+def tree_chunk_manifest(tree_name):
+    directory = get_chunk_directory(tree_name)
+    return send_file(os.path.join(directory, "manifest.json"), mimetype="application/json")
+
+
+@app.route('/trees/<tree_name>/chunks/<chunk_id>', methods=["GET"])
+def tree_chunk(tree_name, chunk_id):
+    directory = get_chunk_directory(tree_name, request.args.get("version"))
+    chunk_path = os.path.join(directory, f"{secure_filename(chunk_id)}.json")
+    if not os.path.exists(chunk_path):
+        abort(404)
+    return send_file(chunk_path, mimetype="application/json")
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,296 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cache_util import compute_cache_key
+from clade_aggregation_util import accumulate_bottom_up, summarize_category_counts
+from newick_writer_util import get_node_name, linkage_to_flat_tree
+
+# scipy is imported by the functions that build linkages, importing this module stays cheap
+
+
+# Function to find the k clades that remain after undoing the last k - 1 merges of a linkage
+def get_top_clades(Z, k):
+    n_leaves = len(Z) + 1
+    k = max(1, min(k, n_leaves))
+    root = 2 * n_leaves - 2
+    undone = set(range(root, root - (k - 1), -1))
+    if not undone:
+        return np.array([root])
+    clades = [
+        int(child)
+        for cluster in undone
+        for child in Z[cluster - n_leaves, :2]
+        if int(child) not in undone
+    ]
+    return np.array(sorted(clades))
+
+
+# Function to label every leaf with the index of the top clade it belongs to
+def assign_leaves_to_clades(Z, clades):
+    n_leaves = len(Z) + 1
+    children = Z[:, :2].astype(np.int64)
+    labels = np.full(2 * n_leaves - 1, -1, dtype=np.int64)
+    labels[clades] = np.arange(len(clades))
+    # Merges are numbered bottom-up, so walking them backwards visits parents first
+    for i in range(n_leaves - 2, -1, -1):
+        if labels[n_leaves + i] >= 0:
+            labels[children[i]] = labels[n_leaves + i]
+    return labels[:n_leaves]
+
+
+# Function to compute the size and centroid of every clade from per-cell labels
+def compute_clade_centroids(X, labels, k):
+    sizes = np.bincount(labels, minlength=k)
+    sums = np.zeros((k, X.shape[1]))
+    np.add.at(sums, labels, X)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        centroids = sums / sizes[:, None]
+    return sizes, centroids
+
+
+# Function to assign cells to their nearest centroid in blocks of bounded memory
+def assign_to_nearest_centroid(X, centroids, chunk_size=65536):
+    labels = np.empty(len(X), dtype=np.int64)
+    centroid_norms = (centroids**2).sum(axis=1)
+    for start in range(0, len(X), chunk_size):
+        block = X[start : start + chunk_size]
+        # |x - c|^2 without the |x|^2 term, which does not change the nearest centroid
+        distances = centroid_norms - 2 * block @ centroids.T
+        labels[start : start + chunk_size] = distances.argmin(axis=1)
+    return labels
+
+
+# Function to reduce a linkage of one sample to its top-k clades
+def summarize_linkage(Z, X, k=50, sample=""):
+    Z = np.asarray(Z, dtype=np.float64)
+    n_leaves = len(Z) + 1
+    clades = get_top_clades(Z, k)
+    labels = assign_leaves_to_clades(Z, clades)
+    sizes, centroids = compute_clade_centroids(X, labels, len(clades))
+    # Leaf clades have no merge of their own, indexing Z with them would wrap around
+    heights = np.zeros(len(clades))
+    internal = clades >= n_leaves
+    heights[internal] = Z[clades[internal] - n_leaves, 2]
+
+    return {
+        "sample": sample,
+        "centroids": centroids,
+        "sizes": sizes,
+        "heights": heights,
+        "n_cells": n_leaves,
+    }
+
+
+# Function to build a subsampled ward tree of one sample and reduce it to a fixed-size summary
+def summarize_sample(X, k=50, max_cells=None, method="ward", sample="", seed=0):
+    from scipy.cluster.hierarchy import linkage
+
+    X = np.asarray(X, dtype=np.float64)
+    subsample = X
+    if max_cells is not None and len(X) > max_cells:
+        rng = np.random.default_rng(seed)
+        subsample = X[np.sort(rng.choice(len(X), max_cells, replace=False))]
+
+    summary = summarize_linkage(linkage(subsample, method), subsample, k, sample)
+
+    if subsample is not X:
+        # Clades come from the subsample, sizes and centroids are recomputed from every cell
+        labels = assign_to_nearest_centroid(X, summary["centroids"])
+        sizes, centroids = compute_clade_centroids(X, labels, len(summary["sizes"]))
+        summary["sizes"] = sizes
+        summary["centroids"] = np.where(
+            sizes[:, None] > 0, centroids, summary["centroids"]
+        )
+        summary["n_cells"] = len(X)
+
+    return summary
+
+
+# Function to save a sample summary so it can be reused without reclustering
+def save_summary(summary, file_name):
+    np.savez(
+        file_name,
+        sample=np.array(summary["sample"]),
+        centroids=summary["centroids"],
+        sizes=summary["sizes"],
+        heights=summary["heights"],
+        n_cells=np.array(summary["n_cells"]),
+    )
+
+
+# Function to load a sample summary written by save_summary
+def load_summary(file_name):
+    with np.load(file_name) as data:
+        return {
+            "sample": str(data["sample"]),
+            "centroids": data["centroids"],
+            "sizes": data["sizes"],
+            "heights": data["heights"],
+            "n_cells": int(data["n_cells"]),
+        }
+
+
+# Function to find the cache file of a sample summary, keyed by the embedding and the parameters
+def get_summary_file_name(X, k, max_cells, method, cache_directory):
+    X = np.ascontiguousarray(X)
+    # The raw buffer alone does not tell a (100, 50) from a (50, 100) embedding
+    params = {
+        "k": k,
+        "max_cells": max_cells,
+        "method": method,
+        "shape": list(X.shape),
+        "dtype": X.dtype.str,
+    }
+    key = compute_cache_key(memoryview(X), params)
+    return os.path.join(cache_directory, f"{key}.npz")
+
+
+# Function to load a cached sample summary under the name of the sample it is reused for
+def load_cached_summary(file_name, sample):
+    summary = load_summary(file_name)
+    summary["sample"] = sample
+    return summary
+
+
+# Function to compute a sample summary and write it to the cache if a file name is given
+def compute_sample_summary(X, sample, k, max_cells, method, file_name=None):
+    summary = summarize_sample(X, k, max_cells, method, sample)
+    if file_name is not None:
+        os.makedirs(os.path.dirname(file_name), exist_ok=True)
+        # Write to a private file first so an interrupted write never looks cached.
+        # An open file is passed because np.savez appends .npz to other file names.
+        part_name = f"{file_name}.{os.getpid()}.part"
+        with open(part_name, "wb") as f:
+            save_summary(summary, f)
+        os.replace(part_name, file_name)
+    return summary
+
+
+# Function to load a cached sample summary or compute and cache it
+def get_sample_summary(X, sample, k, max_cells, method, cache_directory):
+    if cache_directory is None:
+        return summarize_sample(X, k, max_cells, method, sample)
+
+    file_name = get_summary_file_name(X, k, max_cells, method, cache_directory)
+    if os.path.exists(file_name):
+        return load_cached_summary(file_name, sample)
+    return compute_sample_summary(X, sample, k, max_cells, method, file_name)
+
+
+# Function to summarize several samples in parallel, each one cached on its own
+def summarize_samples(
+    samples, k=50, max_cells=None, method="ward", cache_directory=None, max_workers=None
+):
+    summaries = {}
+    missing = {}
+    # Cached samples are loaded here, only the others are sent to the worker processes
+    for sample, X in samples.items():
+        file_name = None
+        if cache_directory is not None:
+            file_name = get_summary_file_name(X, k, max_cells, method, cache_directory)
+            if os.path.exists(file_name):
+                summaries[sample] = load_cached_summary(file_name, sample)
+                continue
+        missing[sample] = (X, file_name)
+
+    if missing:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                sample: executor.submit(
+                    compute_sample_summary, X, sample, k, max_cells, method, file_name
+                )
+                for sample, (X, file_name) in missing.items()
+            }
+            for sample, future in futures.items():
+                summaries[sample] = future.result()
+
+    return [summaries[sample] for sample in samples]
+
+
+# Function to merge sample summaries into a meta-tree by linking their clade centroids.
+# Centroids are only comparable if every sample was projected into one shared PCA basis
+# (e.g. a PCA fitted on the pooled or a reference sample), not one PCA per sample.
+# The linkage runs on the centroids alone, clade sizes are reported but not used as weights.
+def merge_summaries(summaries, method="ward"):
+    from scipy.cluster.hierarchy import linkage
+
+    dimensions = {s["centroids"].shape[1] for s in summaries}
+    if len(dimensions) > 1:
+        raise ValueError(
+            f"Sample summaries have different embedding dimensions: {sorted(dimensions)}"
+        )
+    centroids = np.vstack([summary["centroids"] for summary in summaries])
+    if len(centroids) < 2:
+        raise ValueError("At least two clades are needed to build a meta-tree")
+
+    return {
+        "linkage": linkage(centroids, method),
+        "sample": [s["sample"] for s in summaries for _ in range(len(s["sizes"]))],
+        "clade": np.concatenate([np.arange(len(s["sizes"])) for s in summaries]),
+        "sizes": np.concatenate([s["sizes"] for s in summaries]),
+        "heights": np.concatenate([s["heights"] for s in summaries]),
+        "centroids": centroids,
+    }
+
+
+# Function to convert a merged meta-tree into the JSON tree format of the viewer
+def meta_tree_to_json(merged):
+    sample = merged["sample"]
+    leaf_names = [f"{name}:{clade}" for name, clade in zip(sample, merged["clade"])]
+    flat_tree = linkage_to_flat_tree(merged["linkage"], leaf_names)
+    cluster_id = flat_tree["cluster_id"]
+    is_leaf = flat_tree["is_leaf"]
+    n_leaves = len(leaf_names)
+
+    # Cell counts per sample below every node, weighted by the clade sizes
+    samples, codes = np.unique(np.array(sample, dtype=object), return_inverse=True)
+    cells = np.zeros((len(cluster_id), len(samples)), dtype=np.int64)
+    leaves = np.flatnonzero(is_leaf)
+    cells[leaves, codes[cluster_id[leaves]]] = merged["sizes"][cluster_id[leaves]]
+    composition = summarize_category_counts(
+        accumulate_bottom_up(flat_tree, cells), samples
+    )
+
+    nodes = []
+    for i, cluster in enumerate(cluster_id):
+        length = flat_tree["length"][i]
+        node = {
+            "name": get_node_name(flat_tree, i),
+            "length": 0 if np.isnan(length) else float(length),
+        }
+        if cluster < n_leaves:
+            node["values"] = {
+                "sample": sample[cluster],
+                "clade": int(merged["clade"][cluster]),
+                "size": int(merged["sizes"][cluster]),
+                "height": float(merged["heights"][cluster]),
+            }
+        else:
+            node["values"] = {
+                "size": int(composition["counts"][i].sum()),
+                "sample_purity": float(composition["purity"][i]),
+                "sample_entropy": float(composition["entropy"][i]),
+            }
+            node["children"] = []
+        nodes.append(node)
+        if flat_tree["parent"][i] >= 0:
+            nodes[flat_tree["parent"][i]]["children"].append(node)
+
+    return nodes[0]
+
+
+# Function to build an atlas-level meta-tree from per-sample embeddings in one shared PCA basis
+def build_atlas_tree(
+    samples,
+    k=50,
+    max_cells=None,
+    method="ward",
+    cache_directory=None,
+    max_workers=None,
+):
+    summaries = summarize_samples(
+        samples, k, max_cells, method, cache_directory, max_workers
+    )
+    return meta_tree_to_json(merge_summaries(summaries, method))
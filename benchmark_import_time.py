@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules that CLI calls and Flask workers import at startup
+STARTUP_MODULES = [
+    "advanced_tree_parser_util",
+    "tree_chunking_util",
+    "cache_util",
+    "clade_aggregation_util",
+    "newick_writer_util",
+    "atlas_summary_util",
+    "util",
+    "simulated_dataset_cell_to_dendrogramm",
+    "create_dendogram_sequence_pbmc3k",
+    "job_queue",
+    "app",
+]
+
+# Dependencies that must only be loaded by the code paths that use them
+HEAVY_MODULES = [
+    "scanpy",
+    "anndata",
+    "pandas",
+    "scipy",
+    "sklearn",
+    "matplotlib",
+    "ete3",
+    "Bio",
+]
+
+# Code run in a fresh interpreter to time a single import
+MEASURE_IMPORT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+heavy = sorted({{name.split(".")[0] for name in sys.modules}} & set({heavy!r}))
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+
+# Function to time the import of a module in a fresh interpreter
+def measure_import(module, repeat=5):
+    code = MEASURE_IMPORT.format(module=module, heavy=HEAVY_MODULES)
+    timings = []
+    heavy = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        timings.append(result["seconds"])
+        heavy = result["heavy"]
+    # The fastest run is the least disturbed by the rest of the machine
+    return min(timings), heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Measure the import time of the startup modules."
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=1.0,
+        help="Maximum import time of a single module in seconds.",
+    )
+    args = parser.parse_args()
+
+    failures = []
+    for module in STARTUP_MODULES:
+        seconds, heavy = measure_import(module, args.repeat)
+        print(f"{module:<40} {seconds * 1000:8.1f} ms  {', '.join(heavy)}")
+        if heavy:
+            failures.append(f"{module} imports {', '.join(heavy)} at startup")
+        if seconds > args.budget:
+            failures.append(f"{module} takes {seconds:.2f}s to import")
+
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
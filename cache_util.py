@@ -0,0 +1,9 @@
+import hashlib
+import json
+
+
+# Function to compute the cache key of some input data and the parameters it is processed with
+def compute_cache_key(data, params):
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
@@ -0,0 +1,249 @@
+import numpy as np
+
+
+# Function to flatten a nested JSON tree into preorder arrays
+def flatten_tree(tree):
+    names = []
+    lengths = []
+    parents = []
+    depths = []
+    values = []
+    nodes = []
+
+    # Walk the tree iteratively so deep dendrograms do not hit the recursion limit
+    stack = [(tree, -1, 0)]
+    while stack:
+        node, parent, depth = stack.pop()
+        index = len(nodes)
+        nodes.append(node)
+        names.append(node.get("name", ""))
+        length = node.get("length")
+        lengths.append(length if isinstance(length, (int, float)) else np.nan)
+        parents.append(parent)
+        depths.append(depth)
+        values.append(node.get("values", {}))
+        # Push the children in reverse so they are visited in their original order
+        for child in reversed(node.get("children", [])):
+            stack.append((child, index, depth + 1))
+
+    parent = np.asarray(parents, dtype=np.int64)
+    child_count = np.bincount(parent[1:], minlength=len(nodes))
+
+    return {
+        "name": names,
+        "length": np.asarray(lengths, dtype=np.float64),
+        "parent": parent,
+        "depth": np.asarray(depths, dtype=np.int64),
+        "is_leaf": child_count == 0,
+        "values": values,
+        "nodes": nodes,
+    }
+
+
+# Function to group the node indices of a flat tree by depth
+def get_depth_levels(flat_tree):
+    depth = flat_tree["depth"]
+    order = np.argsort(depth, kind="stable")
+    bounds = np.searchsorted(depth[order], np.arange(depth.max() + 2))
+    return [
+        order[bounds[level] : bounds[level + 1]] for level in range(depth.max() + 1)
+    ]
+
+
+# Function to sum per-node rows bottom-up so that every node holds the total of its subtree
+def accumulate_bottom_up(flat_tree, per_node, levels=None):
+    if levels is None:
+        levels = get_depth_levels(flat_tree)
+    parent = flat_tree["parent"]
+    totals = np.array(per_node, copy=True)
+    # Every level is added to its parents in one vectorized step, deepest level first
+    for level_nodes in reversed(levels[1:]):
+        np.add.at(totals, parent[level_nodes], totals[level_nodes])
+    return totals
+
+
+# Function to mark every node that has a flagged proper ancestor
+def has_flagged_ancestor(flat_tree, flags, levels=None):
+    if levels is None:
+        levels = get_depth_levels(flat_tree)
+    parent = flat_tree["parent"]
+    covered = np.zeros(len(flags), dtype=bool)
+    for level_nodes in levels[1:]:
+        parents = parent[level_nodes]
+        covered[level_nodes] = covered[parents] | flags[parents]
+    return covered
+
+
+# Function to read one leaf attribute of a flat tree, missing values become None
+def get_leaf_attribute(flat_tree, _property):
+    leaves = np.flatnonzero(flat_tree["is_leaf"])
+    return leaves, [flat_tree["values"][i].get(_property, None) for i in leaves]
+
+
+# Function to compute per-node category counts, purity and entropy plus numeric means in one pass
+def aggregate_clade_attributes(tree, categorical=(), numeric=(), flat_tree=None):
+    if flat_tree is None:
+        flat_tree = flatten_tree(tree)
+    n_nodes = len(flat_tree["nodes"])
+    leaves = np.flatnonzero(flat_tree["is_leaf"])
+
+    # Every attribute gets a block of columns in one leaf matrix, so the tree is only walked once
+    columns = [np.zeros((n_nodes, 1))]
+    columns[0][leaves, 0] = 1
+    layout = {}
+    offset = 1
+
+    for _property in categorical:
+        _, raw = get_leaf_attribute(flat_tree, _property)
+        present = np.array([value is not None for value in raw], dtype=bool)
+        labels = np.array([str(value) for value in raw], dtype=object)
+        categories, codes = np.unique(labels[present], return_inverse=True)
+        block = np.zeros((n_nodes, len(categories)))
+        block[leaves[present], codes] = 1
+        columns.append(block)
+        layout[_property] = ("categorical", offset, categories)
+        offset += len(categories)
+
+    for _property in numeric:
+        _, raw = get_leaf_attribute(flat_tree, _property)
+        numbers = np.array(
+            [value if isinstance(value, (int, float)) else np.nan for value in raw],
+            dtype=np.float64,
+        )
+        present = ~np.isnan(numbers)
+        block = np.zeros((n_nodes, 2))
+        block[leaves[present], 0] = numbers[present]
+        block[leaves[present], 1] = 1
+        columns.append(block)
+        layout[_property] = ("numeric", offset, None)
+        offset += 2
+
+    totals = accumulate_bottom_up(flat_tree, np.hstack(columns))
+
+    result = {"flat_tree": flat_tree, "leaf_count": totals[:, 0].astype(np.int64)}
+    for _property, (kind, start, categories) in layout.items():
+        if kind == "categorical":
+            counts = totals[:, start : start + len(categories)].astype(np.int64)
+            result[_property] = summarize_category_counts(counts, categories)
+        else:
+            sums = totals[:, start]
+            present = totals[:, start + 1]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                means = np.where(present > 0, sums / present, np.nan)
+            result[_property] = {"mean": means, "count": present.astype(np.int64)}
+
+    return result
+
+
+# Function to derive majority category, purity and entropy from per-node category counts
+def summarize_category_counts(counts, categories):
+    total = counts.sum(axis=1)
+    majority = (
+        counts.argmax(axis=1)
+        if counts.shape[1]
+        else np.zeros(len(counts), dtype=np.int64)
+    )
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fractions = counts / total[:, None]
+        purity = np.where(total > 0, fractions.max(axis=1, initial=0), np.nan)
+        entropy = np.where(counts > 0, fractions * np.log2(1 / fractions), 0).sum(
+            axis=1
+        )
+    entropy[total == 0] = np.nan
+
+    return {
+        "categories": categories,
+        "counts": counts,
+        "majority": majority,
+        "purity": purity,
+        "entropy": entropy,
+    }
+
+
+# Function to find the top-most internal nodes whose purity reaches the threshold
+def find_collapsible_nodes(
+    aggregation,
+    group_property,
+    threshold=0.9,
+    min_leaves=1,
+    min_labelled_fraction=0.5,
+):
+    flat_tree = aggregation["flat_tree"]
+    summary = aggregation[group_property]
+    # Purity only covers leaves that carry the property, so both limits use that count
+    labelled = summary["counts"].sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        labelled_fraction = labelled / aggregation["leaf_count"]
+    candidates = (
+        ~flat_tree["is_leaf"]
+        & (np.nan_to_num(summary["purity"], nan=-1.0) >= threshold)
+        & (labelled >= min_leaves)
+        & (np.nan_to_num(labelled_fraction) >= min_labelled_fraction)
+    )
+    hidden = has_flagged_ancestor(flat_tree, candidates)
+    return candidates & ~hidden, hidden
+
+
+# Function to build a collapsed copy of the tree from a collapse mask
+def build_collapsed_tree(aggregation, group_property, collapsed, hidden):
+    flat_tree = aggregation["flat_tree"]
+    summary = aggregation[group_property]
+    parent = flat_tree["parent"]
+    copies = [None] * len(flat_tree["nodes"])
+
+    for i, node in enumerate(flat_tree["nodes"]):
+        if hidden[i]:
+            continue
+        copy = {key: value for key, value in node.items() if key != "children"}
+        if collapsed[i]:
+            # Keep the same placeholder child that collapse_nodes uses for uniform clades
+            copy["children"] = [
+                {
+                    "name": "Collapsed Group",
+                    "values": {
+                        group_property: summary["categories"][summary["majority"][i]],
+                        "purity": float(summary["purity"][i]),
+                        "entropy": float(summary["entropy"][i]),
+                        "leaf_count": int(aggregation["leaf_count"][i]),
+                    },
+                }
+            ]
+        elif "children" in node:
+            copy["children"] = []
+        copies[i] = copy
+        if parent[i] >= 0:
+            copies[parent[i]]["children"].append(copy)
+
+    return copies[0]
+
+
+# Function to collapse every clade in which one category makes up at least the threshold
+def collapse_nodes_by_purity(
+    tree, group_property, threshold=0.9, min_leaves=1, min_labelled_fraction=0.5
+):
+    aggregation = aggregate_clade_attributes(tree, categorical=[group_property])
+    collapsed, hidden = find_collapsible_nodes(
+        aggregation, group_property, threshold, min_leaves, min_labelled_fraction
+    )
+    return build_collapsed_tree(aggregation, group_property, collapsed, hidden)
+
+
+# Function to precompute collapsed views of a tree for several purity thresholds
+def precompute_collapsed_views(
+    tree,
+    group_property,
+    thresholds=(1.0, 0.95, 0.9, 0.8),
+    min_leaves=1,
+    min_labelled_fraction=0.5,
+):
+    # The aggregation is shared, each threshold only costs a mask and a copy of the visible nodes
+    aggregation = aggregate_clade_attributes(tree, categorical=[group_property])
+    views = {}
+    for threshold in thresholds:
+        collapsed, hidden = find_collapsible_nodes(
+            aggregation, group_property, threshold, min_leaves, min_labelled_fraction
+        )
+        views[threshold] = build_collapsed_tree(
+            aggregation, group_property, collapsed, hidden
+        )
+    return views
@@ -0,0 +1,208 @@
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from cache_util import compute_cache_key
+
+# Directory where uploaded inputs and finished tree builds are cached, next to app.py
+CACHE_DIRECTORY = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "cache", "jobs"
+)
+
+# Stages of the tree build pipeline, in the order they report progress
+TREE_BUILD_STAGES = ["load", "preprocess", "reduce", "cluster", "convert"]
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# Function to load an uploaded expression matrix as an AnnData object
+def load_expression_matrix(input_path):
+    import numpy as np
+    import scanpy as sc
+
+    if input_path.endswith(".h5ad"):
+        return sc.read_h5ad(input_path)
+    delimiter = "\t" if input_path.endswith((".tsv", ".txt")) else ","
+    return sc.AnnData(np.loadtxt(input_path, delimiter=delimiter))
+
+
+# Function to run the preprocess, SVD, linkage and JSON conversion pipeline in a worker
+def build_tree_from_matrix(input_path, result_path, params, report):
+    from scipy.cluster.hierarchy import linkage
+
+    from newick_writer_util import write_linkage_json
+    from simulated_dataset_cell_to_dendrogramm import (
+        preprocess_data,
+        reduce_dimensionality,
+    )
+
+    report("load")
+    adata = load_expression_matrix(input_path)
+    report("preprocess")
+    adata = preprocess_data(adata)
+    report("reduce")
+    adata = reduce_dimensionality(adata, params.get("n_components", 50))
+    report("cluster")
+    Z = linkage(adata.obsm["X_pca"], params.get("method", "ward"))
+    report("convert")
+    # Write next to the cache entry first so an interrupted build never looks finished.
+    # The JSON is streamed from the flat tree, a deep dendrogram would overflow json.dump.
+    write_linkage_json(Z, result_path + ".part", list(adata.obs_names))
+    os.replace(result_path + ".part", result_path)
+
+
+# Function executed in the pool process, reports progress and honours cancellation
+def run_job(pipeline, job_id, input_path, result_path, params, progress, cancelled):
+    stages = TREE_BUILD_STAGES
+
+    def report(stage):
+        if cancelled.get(job_id, False):
+            raise JobCancelled(job_id)
+        progress[job_id] = {
+            "stage": stage,
+            "completed": stages.index(stage) if stage in stages else 0,
+            "total": len(stages),
+        }
+
+    pipeline(input_path, result_path, params, report)
+    if cancelled.get(job_id, False):
+        raise JobCancelled(job_id)
+    progress[job_id] = {"stage": "done", "completed": len(stages), "total": len(stages)}
+    return result_path
+
+
+class JobManager:
+    def __init__(
+        self, pipeline=build_tree_from_matrix, max_workers=None, cache_directory=None
+    ):
+        self.pipeline = pipeline
+        self.max_workers = max_workers
+        self.cache_directory = os.path.abspath(cache_directory or CACHE_DIRECTORY)
+        self.jobs = {}
+        self.jobs_by_key = {}
+        self.lock = threading.Lock()
+        # The pool and the shared progress state are created on the first submission
+        self.executor = None
+        self.manager = None
+        self.progress = None
+        self.cancelled = None
+
+    def start(self):
+        if self.executor is None:
+            self.manager = multiprocessing.Manager()
+            self.progress = self.manager.dict()
+            self.cancelled = self.manager.dict()
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.manager.shutdown()
+            self.executor = None
+
+    def get_result_path(self, key):
+        return os.path.join(self.cache_directory, f"{key}.json")
+
+    def submit_to_executor(self, *args):
+        try:
+            return self.executor.submit(*args)
+        except BrokenProcessPool:
+            # A crashed worker (e.g. killed for memory) breaks the whole pool, replace it
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self.executor.submit(*args)
+
+    def submit(self, input_bytes, file_name, params):
+        extension = os.path.splitext(file_name)[1].lower()
+        # The extension selects the parser, so it is part of the cache key
+        key = compute_cache_key(input_bytes, {**params, "extension": extension})
+        with self.lock:
+            # Identical inputs share one job while it is queued, running or finished
+            job_id = self.jobs_by_key.get(key)
+            if job_id is not None and self.get_state(job_id) not in (
+                "failed",
+                "cancelled",
+            ):
+                return job_id
+
+            job_id = uuid.uuid4().hex
+            result_path = self.get_result_path(key)
+            job = {"key": key, "params": params, "created": time.time()}
+            self.jobs[job_id] = job
+            self.jobs_by_key[key] = job_id
+
+            if os.path.exists(result_path):
+                job["future"] = None
+                return job_id
+
+            self.start()
+            os.makedirs(self.cache_directory, exist_ok=True)
+            input_path = os.path.join(self.cache_directory, key + extension)
+            with open(input_path, "wb") as f:
+                f.write(input_bytes)
+
+            job["future"] = self.submit_to_executor(
+                run_job,
+                self.pipeline,
+                job_id,
+                input_path,
+                result_path,
+                params,
+                self.progress,
+                self.cancelled,
+            )
+            return job_id
+
+    def get_state(self, job_id):
+        future = self.jobs[job_id]["future"]
+        if future is None:
+            return "completed"
+        if future.cancelled():
+            return "cancelled"
+        if future.done():
+            if isinstance(future.exception(), JobCancelled):
+                return "cancelled"
+            if future.exception() is not None:
+                return "failed"
+            return "completed"
+        if self.cancelled.get(job_id, False):
+            return "cancelling"
+        if job_id in self.progress:
+            return "running"
+        return "queued"
+
+    def status(self, job_id):
+        if job_id not in self.jobs:
+            return None
+        job = self.jobs[job_id]
+        state = self.get_state(job_id)
+        status = {"job_id": job_id, "state": state, "params": job["params"]}
+        if job["future"] is None:
+            status["cached"] = True
+        elif job_id in self.progress:
+            status["progress"] = self.progress[job_id]
+        if state == "failed":
+            status["error"] = str(job["future"].exception())
+        return status
+
+    def get_result(self, job_id):
+        if job_id not in self.jobs or self.get_state(job_id) != "completed":
+            return None
+        return self.get_result_path(self.jobs[job_id]["key"])
+
+    def cancel(self, job_id):
+        if job_id not in self.jobs:
+            return False
+        future = self.jobs[job_id]["future"]
+        if future is None or future.done():
+            return False
+        # Queued jobs are dropped directly, running jobs stop at their next stage
+        if not future.cancel():
+            self.cancelled[job_id] = True
+        return True
@@ -0,0 +1,298 @@
+import json
+import os
+import re
+
+import numpy as np
+
+# Characters that force a Newick label to be quoted
+NEWICK_SPECIAL_CHARACTERS = re.compile(r"[\s()\[\]':;,]")
+
+# Characters that would end or split a bracket or NHX comment, percent-encoded in keys and values
+ANNOTATION_SPECIAL_CHARACTERS = re.compile(r"[%,\[\]:=;]")
+
+
+# Function to convert a scipy linkage matrix into a flat tree in preorder
+def linkage_to_flat_tree(Z, leaf_names=None):
+    Z = np.asarray(Z, dtype=np.float64)
+    n_leaves = Z.shape[0] + 1
+    n_nodes = 2 * n_leaves - 1
+    # 32-bit indices halve the footprint of the per-node arrays of large dendrograms
+    index_type = np.int32 if n_nodes < 2**31 else np.int64
+    children = Z[:, :2].astype(index_type)
+    # Leaves sit at height zero, the cluster n + i sits at the height of merge i
+    heights = np.concatenate([np.zeros(n_leaves), Z[:, 2]])
+
+    cluster_id = np.empty(n_nodes, dtype=index_type)
+    parent = np.empty(n_nodes, dtype=index_type)
+    depth = np.empty(n_nodes, dtype=index_type)
+
+    # Walk the merges iteratively, a million-leaf dendrogram is far too deep for recursion
+    stack = [(n_nodes - 1, -1, 0)]
+    index = 0
+    while stack:
+        cluster, parent_index, node_depth = stack.pop()
+        cluster_id[index] = cluster
+        parent[index] = parent_index
+        depth[index] = node_depth
+        if cluster >= n_leaves:
+            left, right = children[cluster - n_leaves]
+            stack.append((right, index, node_depth + 1))
+            stack.append((left, index, node_depth + 1))
+        index += 1
+
+    length = np.full(n_nodes, np.nan)
+    length[1:] = heights[cluster_id[parent[1:]]]
+    length[1:] -= heights[cluster_id[1:]]
+    is_leaf = cluster_id < n_leaves
+
+    # Names are looked up by cluster id while writing instead of being copied per node
+    return {
+        "leaf_names": leaf_names,
+        "length": length,
+        "parent": parent,
+        "depth": depth,
+        "is_leaf": is_leaf,
+        "cluster_id": cluster_id,
+    }
+
+
+# Function to get the name of a node of a flat tree or of a converted linkage
+def get_node_name(flat_tree, index):
+    if "name" in flat_tree:
+        return flat_tree["name"][index]
+    if not flat_tree["is_leaf"][index]:
+        return ""
+    cluster = flat_tree["cluster_id"][index]
+    if flat_tree["leaf_names"] is None:
+        return str(cluster)
+    return flat_tree["leaf_names"][cluster]
+
+
+# Function to collect node values of a flat tree into annotation columns
+def values_to_annotation_columns(flat_tree, properties):
+    return {
+        _property: [values.get(_property) for values in flat_tree["values"]]
+        for _property in properties
+    }
+
+
+# Function to quote a Newick label if it contains reserved characters
+def format_newick_label(label):
+    label = str(label)
+    if NEWICK_SPECIAL_CHARACTERS.search(label):
+        return "'" + label.replace("'", "''") + "'"
+    return label
+
+
+# Function to percent-encode the characters that are reserved inside annotation comments
+def escape_annotation_text(text):
+    return ANNOTATION_SPECIAL_CHARACTERS.sub(
+        lambda match: f"%{ord(match.group()):02X}", text
+    )
+
+
+# Function to format one annotation value with the requested precision
+def format_annotation_value(value, precision):
+    if isinstance(value, (float, np.floating)):
+        return f"{value:.{precision}g}"
+    return escape_annotation_text(str(value))
+
+
+# Function to format the annotations of one node as a bracket or NHX comment
+def format_annotations(annotations, row, precision, annotation_format):
+    pairs = []
+    for key, column in annotations.items():
+        # Leaf-only columns of a linkage have no entry for the merged clusters
+        if row >= len(column):
+            continue
+        value = column[row]
+        if value is None or (
+            isinstance(value, (float, np.floating)) and np.isnan(value)
+        ):
+            continue
+        pairs.append(
+            (
+                escape_annotation_text(str(key)),
+                format_annotation_value(value, precision),
+            )
+        )
+    if not pairs:
+        return ""
+    if annotation_format == "nhx":
+        return "[&&NHX:" + ":".join(f"{key}={value}" for key, value in pairs) + "]"
+    # Same [key=value,...] comments that extract_values_in_brackets_as_dict reads back,
+    # escaped values come back percent-encoded and can be restored with urllib.parse.unquote
+    return "[" + ",".join(f"{key}={value}" for key, value in pairs) + "]"
+
+
+# Function to format the label, annotations and branch length of one node
+def format_newick_node(flat_tree, index, annotations, precision, annotation_format):
+    text = format_newick_label(get_node_name(flat_tree, index))
+    # Annotations of a converted linkage are indexed by scipy cluster id
+    row = flat_tree["cluster_id"][index] if "cluster_id" in flat_tree else index
+    comment = format_annotations(annotations, row, precision, annotation_format)
+    if annotation_format != "nhx":
+        text += comment
+    length = flat_tree["length"][index]
+    if not np.isnan(length):
+        text += f":{length:.{precision}g}"
+    if annotation_format == "nhx":
+        text += comment
+    return text
+
+
+# Function to serialize a flat tree to a Newick or NHX file without building the whole string
+def write_flat_tree_newick(
+    flat_tree,
+    destination,
+    annotations=None,
+    precision=6,
+    annotation_format="brackets",
+    buffer_size=1 << 16,
+):
+    if annotation_format not in ("brackets", "nhx"):
+        raise ValueError(f"Unknown annotation format: '{annotation_format}'")
+    annotations = annotations or {}
+    n_nodes = len(flat_tree["depth"])
+    if "cluster_id" in flat_tree:
+        # Linkage columns hold one entry per leaf or one per cluster
+        sizes = ((n_nodes + 1) // 2, n_nodes)
+    else:
+        sizes = (n_nodes,)
+    for key, column in annotations.items():
+        if len(column) not in sizes:
+            raise ValueError(f"Annotation column '{key}' does not match the tree size")
+
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, "w") as f:
+            write_flat_tree_newick(
+                flat_tree, f, annotations, precision, annotation_format, buffer_size
+            )
+        return
+
+    depth = flat_tree["depth"]
+    parent = flat_tree["parent"]
+    is_leaf = flat_tree["is_leaf"]
+    buffer = []
+    buffered = 0
+    # Internal nodes whose closing bracket is still pending, one per depth level
+    open_nodes = []
+
+    def emit(text):
+        nonlocal buffered
+        buffer.append(text)
+        buffered += len(text)
+        if buffered >= buffer_size:
+            destination.write("".join(buffer))
+            buffer.clear()
+            buffered = 0
+
+    for i in range(len(depth)):
+        # Close every open clade that is not an ancestor of the current node
+        while len(open_nodes) > depth[i]:
+            node = open_nodes.pop()
+            emit(")")
+            emit(
+                format_newick_node(
+                    flat_tree, node, annotations, precision, annotation_format
+                )
+            )
+        # In preorder the first child directly follows its parent, every other node is a sibling
+        if i > 0 and parent[i] != i - 1:
+            emit(",")
+        if is_leaf[i]:
+            emit(
+                format_newick_node(
+                    flat_tree, i, annotations, precision, annotation_format
+                )
+            )
+        else:
+            emit("(")
+            open_nodes.append(i)
+
+    while open_nodes:
+        node = open_nodes.pop()
+        emit(")")
+        emit(
+            format_newick_node(
+                flat_tree, node, annotations, precision, annotation_format
+            )
+        )
+    emit(";\n")
+    destination.write("".join(buffer))
+
+
+# Function to write a scipy linkage matrix directly as a Newick or NHX file
+def write_linkage_newick(
+    Z,
+    destination,
+    leaf_names=None,
+    annotations=None,
+    precision=6,
+    annotation_format="brackets",
+    buffer_size=1 << 16,
+):
+    # Columns are indexed by scipy cluster id, either one entry per leaf or per cluster
+    flat_tree = linkage_to_flat_tree(Z, leaf_names)
+    write_flat_tree_newick(
+        flat_tree,
+        destination,
+        annotations,
+        precision,
+        annotation_format,
+        buffer_size,
+    )
+
+
+# Function to serialize a flat tree to the nested JSON tree format without recursion
+def write_flat_tree_json(flat_tree, destination, buffer_size=1 << 16):
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, "w") as f:
+            write_flat_tree_json(flat_tree, f, buffer_size)
+        return
+
+    depth = flat_tree["depth"]
+    parent = flat_tree["parent"]
+    is_leaf = flat_tree["is_leaf"]
+    length = flat_tree["length"]
+    buffer = []
+    buffered = 0
+    # Internal nodes whose children list is still open, one per depth level
+    open_nodes = 0
+
+    def emit(text):
+        nonlocal buffered
+        buffer.append(text)
+        buffered += len(text)
+        if buffered >= buffer_size:
+            destination.write("".join(buffer))
+            buffer.clear()
+            buffered = 0
+
+    for i in range(len(depth)):
+        # Close every open clade that is not an ancestor of the current node
+        while open_nodes > depth[i]:
+            open_nodes -= 1
+            emit("]}")
+        # In preorder the first child directly follows its parent, every other node is a sibling
+        if i > 0 and parent[i] != i - 1:
+            emit(", ")
+        # Branch lengths are the height differences of the merges, the root gets 0
+        node_length = 0 if np.isnan(length[i]) else float(length[i])
+        emit(
+            f'{{"name": {json.dumps(get_node_name(flat_tree, i))}, "length": {node_length!r}'
+        )
+        if is_leaf[i]:
+            emit("}")
+        else:
+            emit(', "children": [')
+            open_nodes += 1
+
+    emit("]}" * open_nodes)
+    destination.write("".join(buffer))
+
+
+# Function to write a scipy linkage matrix directly in the nested JSON tree format
+def write_linkage_json(Z, destination, leaf_names=None, buffer_size=1 << 16):
+    flat_tree = linkage_to_flat_tree(Z, leaf_names)
+    write_flat_tree_json(flat_tree, destination, buffer_size)
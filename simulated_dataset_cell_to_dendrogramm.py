@@ -1,17 +1,21 @@
 import numpy as np
-import scanpy as sc
-from scipy.cluster.hierarchy import linkage, to_tree
-from sklearn.decomposition import TruncatedSVD
 import json
 
+# scanpy, scipy and scikit-learn are imported by the pipeline steps that use them,
+# so importing the helpers of this module stays cheap
+
 
 def generate_data(n_samples=3000, n_features=500):
+    import scanpy as sc
+
     X = np.random.rand(n_samples, n_features)
     adata = sc.AnnData(X)
     return adata
 
 
 def preprocess_data(adata):
+    import scanpy as sc
+
     sc.pp.normalize_total(adata, target_sum=1e4)
     sc.pp.log1p(adata)
     sc.pp.highly_variable_genes(adata, min_mean=0.0125, max_mean=3, min_disp=0.5)
@@ -22,12 +26,16 @@ def preprocess_data(adata):
     return adata
 
 
-def reduce_dimensionality(adata):
-    adata.obsm["X_pca"] = TruncatedSVD(n_components=50).fit_transform(adata.X)
+def reduce_dimensionality(adata, n_components=50):
+    from sklearn.decomposition import TruncatedSVD
+
+    adata.obsm["X_pca"] = TruncatedSVD(n_components=n_components).fit_transform(adata.X)
     return adata
 
 
 def cluster_data(adata):
+    from scipy.cluster.hierarchy import linkage, to_tree
+
     Z = linkage(adata.obsm["X_pca"], "ward")
     T = to_tree(Z)
     return T
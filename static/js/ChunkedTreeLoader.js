@@ -0,0 +1,99 @@
+/** Class for loading a tree chunk by chunk from the server. */
+export default class ChunkedTreeLoader {
+  /**
+   * Create a ChunkedTreeLoader.
+   * @param  {String} treeName - Name of the tree served by the /trees/<treeName>/chunks endpoints.
+   * @param  {String} baseUrl
+   */
+  constructor(treeName, baseUrl = "/trees") {
+    this.treeName = treeName;
+    this.baseUrl = baseUrl;
+    this.manifest = null;
+    this.root = null;
+    // chunk id -> pending or resolved request, so every chunk is fetched only once.
+    // Failed requests are removed again, so the chunk can be fetched on the next try.
+    this.chunkRequests = new Map();
+  }
+
+  /**
+   * building the url of a chunk or of the manifest
+   * @param  {String} chunkId
+   * @return {String}
+   */
+  getChunkUrl(chunkId) {
+    const url = `${this.baseUrl}/${encodeURIComponent(this.treeName)}/chunks/${chunkId}`;
+    // Pin every chunk to the version of the manifest, so a tree edited meanwhile is never mixed in
+    return this.manifest ? `${url}?version=${this.manifest.version}` : url;
+  }
+
+  /**
+   * fetching a chunk, concurrent requests for the same chunk share one fetch
+   * @param  {String} chunkId
+   * @return {Promise<Object>}
+   */
+  fetchChunk(chunkId) {
+    if (!this.chunkRequests.has(chunkId)) {
+      const request = d3.json(this.getChunkUrl(chunkId)).catch((error) => {
+        this.chunkRequests.delete(chunkId);
+        throw error;
+      });
+      this.chunkRequests.set(chunkId, request);
+    }
+    return this.chunkRequests.get(chunkId);
+  }
+
+  /**
+   * loading the manifest and the root chunk. The root chunk can be passed to constructTree directly.
+   * @return {Promise<Object>}
+   */
+  async loadRoot() {
+    this.manifest = await d3.json(this.getChunkUrl("manifest"));
+    const chunk = await this.fetchChunk(this.manifest.root);
+    this.root = chunk.nodes[0];
+    return this.root;
+  }
+
+  /**
+   * checking if a node is a stub whose children live in another chunk
+   * @param  {Object} data - node of the JSON tree (d.data of a d3 node)
+   * @return {Boolean}
+   */
+  isStub(data) {
+    return data !== undefined && data.chunk !== undefined && !data.children;
+  }
+
+  /**
+   * replacing a stub with the children stored in its chunk. A chunk can hold several subtrees,
+   * the stub's chunk_index selects its own.
+   * @param  {Object} data - node of the JSON tree (d.data of a d3 node)
+   * @return {Promise<Boolean>} true if the node was expanded
+   */
+  async expand(data) {
+    if (!this.isStub(data)) {
+      return false;
+    }
+    // Read before awaiting, a concurrent expansion of the same stub deletes them
+    const { chunk: chunkId, chunk_index: chunkIndex } = data;
+    const chunk = await this.fetchChunk(chunkId);
+    data.children = chunk.nodes[chunkIndex].children || [];
+    data.loadedChunk = chunkId;
+    delete data.chunk;
+    delete data.chunk_index;
+    return true;
+  }
+
+  /**
+   * expanding several stubs at once, e.g. the stubs that became visible after zooming in.
+   * A failed chunk does not stop the others, its stub stays in place and can be expanded later.
+   * @param  {Array<Object>} stubs - nodes of the JSON tree
+   * @return {Promise<Object>} expanded is true if at least one node was expanded,
+   * errors holds the errors of the chunks that could not be loaded
+   */
+  async expandAll(stubs) {
+    const results = await Promise.allSettled(stubs.map((data) => this.expand(data)));
+    return {
+      expanded: results.some((result) => result.status === "fulfilled" && result.value),
+      errors: results.filter((result) => result.status === "rejected").map((result) => result.reason),
+    };
+  }
+}
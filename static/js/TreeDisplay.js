@@ -31,6 +31,8 @@ export default class TreeDisplay {
     this.msaMatrix = {};
     this.leaveColorMap = {}; // Initialized as empty, to be populated by options
     this.treeColorMap = {};  // Initialized as empty
+    // Called with a stub node (chunked trees) whose children still have to be fetched
+    this.onExpandStub = null;
 
     // Calculate font size based on some algorithm
     this.sizeMap.circleSize = this.calculateCircleNodeRadius();
@@ -256,7 +258,7 @@ export default class TreeDisplay {
   updateNodeCircles() {
     let nodes = this.root;
 
-    let nodesNotCollapsed = nodes.descendants().filter((node) => node.children)
+    let nodesNotCollapsed = nodes.descendants().filter((node) => node.children || this.isStub(node))
 
     // JOIN new data with old SVG elements
     const nodeCircles = this.getSvgContainer()
@@ -284,12 +286,21 @@ export default class TreeDisplay {
       .style("fill", this.colorMap.defaultColor)
       // .attr("filter", "drop-shadow(0px 1px 3px rgba(0, 0, 0, 1))")
       .attr("r", `${2}px`)
-      .on("click", (e, d) => this.handleNodeClick(e, d))
+      .on("click", (e, d) => this.isStub(d) ? this.onExpandStub(d) : this.handleNodeClick(e, d))
       .on("mouseover", (e, d) => mouseOverNode(e, d))
       .on("mouseout", (e, d) => mouseLeaveNode(e, d))
       .raise();
   }
 
+  /**
+   * Checks if a node is a stub of a chunked tree that can be expanded by loading its chunk.
+   * @param {Object} d - The d3 node.
+   * @returns {boolean}
+   */
+  isStub(d) {
+    return this.onExpandStub !== null && d.data.chunk !== undefined && !d.children && !d._children;
+  }
+
   removeNodeCircles() {
     d3.selectAll(".node").remove();
   }
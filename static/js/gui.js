@@ -1,6 +1,7 @@
 
 import TreeDisplay from './TreeDisplay.js';
 import constructTree from './TreeConstructor.js'; // Assuming constructTree is from here
+import ChunkedTreeLoader from './ChunkedTreeLoader.js';
 
 export default class Gui {
   constructor(
@@ -22,6 +23,70 @@ export default class Gui {
     // this.index and this.ignoreBranchLengths should be initialized, e.g.
     this.index = 0; // Default to first tree
     this.ignoreBranchLengths = false; // Default behavior
+    this.chunkLoader = null; // Set when the tree is loaded progressively in chunks
+    this.expandedZoom = 1; // Zoom scale at which visible stubs were last expanded
+  }
+
+  /**
+   * Loads only the root chunk of a tree served by the /trees/<treeName>/chunks endpoints and draws it.
+   * Stub nodes are fetched when they are clicked or zoomed into.
+   * @param {string} treeName
+   */
+  async loadChunkedTree(treeName) {
+    this.chunkLoader = new ChunkedTreeLoader(treeName);
+    const root = await this.chunkLoader.loadRoot();
+    this.treeList = [root];
+    this.index = 0;
+    this.resize();
+    this.updateMain();
+  }
+
+  /**
+   * Fetches the chunk of a stub node, attaches its children and redraws the tree.
+   * @param {Object} d - The d3 node of the stub.
+   */
+  async expandStub(d) {
+    try {
+      if (await this.chunkLoader.expand(d.data)) {
+        this.updateMain();
+      }
+    } catch (error) {
+      // The stub stays in place, so clicking it again retries the request
+      console.error("Could not load chunk", d.data.chunk, error);
+    }
+  }
+
+  /**
+   * Expands the stubs inside the viewport once the zoom scale doubled since the last zoom that
+   * expanded stubs, so zooming into a region only loads the chunks of that region.
+   * Zooming out lowers that scale again, so zooming back into another region loads it too.
+   * @param {number} scale - The current zoom scale.
+   * @param {function} isVisible - Returns true for a d3 node inside the viewport.
+   */
+  async expandVisibleStubs(scale, isVisible) {
+    if (!this.chunkLoader || !this.treeDisplay) {
+      return;
+    }
+    if (scale < this.expandedZoom) {
+      this.expandedZoom = scale;
+      return;
+    }
+    if (scale < this.expandedZoom * 2) {
+      return;
+    }
+    const stubs = this.treeDisplay.root
+      .leaves()
+      .filter((d) => this.treeDisplay.isStub(d) && isVisible(d))
+      .map((d) => d.data);
+    const { expanded, errors } = await this.chunkLoader.expandAll(stubs);
+    if (errors.length > 0) {
+      // Stubs whose chunk failed stay in place and are retried on a later zoom
+      console.error("Could not load", errors.length, "chunks of the visible stubs", errors);
+    }
+    if (expanded) {
+      this.expandedZoom = scale;
+      this.updateMain();
+    }
   }
 
   initializeMovie() {
@@ -127,13 +192,18 @@ export default class Gui {
       this.treeDisplay = new TreeDisplay(d3tree, d3tree.maxRadius, 'application');
     }
 
+    if (this.chunkLoader) {
+      this.treeDisplay.onExpandStub = (d) => this.expandStub(d);
+    }
+
     // Prepare options for TreeDisplay updateDisplay
     let displayOptions = {
       msaMatrix: (this.msaMatrix || []), // Use instance msaMatrix
       leaveColorMap: (this.leaveColorMap || {}), // Use instance leaveColorMap
       fontSize: 1, // Example default, consider making configurable
       strokeWidth: '1px', // Example default
-      mode: 'classical-phylo', // Example default
+      // Chunked trees need the node circles to expand their stubs
+      mode: this.chunkLoader ? 'interactive' : 'classical-phylo',
       // If displayEdgeValue is a feature, it might be controlled by other UI elements later
       // displayEdgeValue: 'length',
       // colorMode: 'regular'
@@ -0,0 +1,130 @@
+import json
+import os
+from collections import deque
+
+# Id of the chunk holding the root of the tree
+ROOT_CHUNK_ID = "0"
+
+# Version of the chunk file layout, chunks written with another layout must not be reused
+CHUNK_FORMAT_VERSION = 2
+
+
+# Function to count the leaves below every node without recursion
+def count_leaves(tree):
+    leaf_counts = {}
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        children = node.get("children", [])
+        if not children:
+            leaf_counts[id(node)] = 1
+        elif visited:
+            leaf_counts[id(node)] = sum(leaf_counts[id(child)] for child in children)
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children)
+    return leaf_counts
+
+
+# Function to count the nodes in the subtree of every node without recursion
+def count_nodes(tree):
+    node_counts = {}
+    stack = [(tree, False)]
+    while stack:
+        node, visited = stack.pop()
+        children = node.get("children", [])
+        if visited:
+            node_counts[id(node)] = 1 + sum(
+                node_counts[id(child)] for child in children
+            )
+        else:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children)
+    return node_counts
+
+
+# Function to copy a node without its children
+def copy_node(node):
+    return {key: value for key, value in node.items() if key != "children"}
+
+
+# Function to split a tree into size- and depth-bounded chunks linked by stub nodes.
+# A chunk holds one or more subtree roots, small sibling subtrees are packed into one chunk.
+def split_tree_into_chunks(tree, max_nodes=1000, max_depth=None):
+    leaf_counts = count_leaves(tree)
+    node_counts = count_nodes(tree)
+    chunks = {}
+    pending = [(ROOT_CHUNK_ID, [tree])]
+    next_chunk_id = 1
+
+    while pending:
+        chunk_id, source_roots = pending.pop()
+        chunk_roots = [copy_node(source) for source in source_roots]
+        chunks[chunk_id] = {"nodes": chunk_roots}
+        node_count = len(chunk_roots)
+        stubs = []
+        # Fill the chunk breadth-first so the levels closest to its roots are loaded first
+        queue = deque(
+            (source, target, 0) for source, target in zip(source_roots, chunk_roots)
+        )
+        while queue:
+            source, target, depth = queue.popleft()
+            children = source.get("children", [])
+            if not children:
+                if "children" in source:
+                    target["children"] = []
+                continue
+
+            over_budget = node_count + len(children) > max_nodes
+            too_deep = max_depth is not None and depth >= max_depth
+            # The chunk roots are always expanded, otherwise the chunk would be empty
+            if depth > 0 and (over_budget or too_deep):
+                stubs.append((source, target))
+                continue
+
+            target["children"] = []
+            for child in children:
+                child_copy = copy_node(child)
+                target["children"].append(child_copy)
+                queue.append((child, child_copy, depth + 1))
+            node_count += len(children)
+
+        # Stubs are found level by level, so neighbouring stubs are siblings or cousins.
+        # They share a chunk as long as their subtrees fit into it together.
+        group = None
+        group_nodes = 0
+        for source, target in stubs:
+            size = node_counts[id(source)]
+            if group is None or group_nodes + size > max_nodes:
+                group = []
+                group_nodes = 0
+                pending.append((str(next_chunk_id), group))
+                next_chunk_id += 1
+            target["chunk"] = pending[-1][0]
+            target["chunk_index"] = len(group)
+            target["leaf_count"] = leaf_counts[id(source)]
+            group.append(source)
+            group_nodes += size
+
+    return chunks
+
+
+# Function to write the chunks of a tree and their manifest into a directory
+def write_tree_chunks(tree, directory, max_nodes=1000, max_depth=None):
+    chunks = split_tree_into_chunks(tree, max_nodes, max_depth)
+    os.makedirs(directory, exist_ok=True)
+    for chunk_id, chunk in chunks.items():
+        with open(os.path.join(directory, f"{chunk_id}.json"), "w") as f:
+            json.dump(chunk, f)
+
+    manifest = {
+        "root": ROOT_CHUNK_ID,
+        "chunk_count": len(chunks),
+        "leaf_count": count_leaves(tree)[id(tree)],
+        "max_nodes": max_nodes,
+        "max_depth": max_depth,
+        "format_version": CHUNK_FORMAT_VERSION,
+    }
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    return manifest
@@ -1,5 +1,3 @@
-from Bio import AlignIO
-from ete3 import Tree
 import json
 import random
 import string
@@ -8,11 +6,10 @@ from advanced_tree_parser_util import (
     convert_pair_bracket_string_to_json,
 )
 import re
-import matplotlib.pyplot as plt
 import numpy as np
-import random
-from sklearn.datasets._samples_generator import make_blobs
-from sklearn.cluster import KMeans
+
+# Biopython, ete3 and matplotlib are imported inside the helpers that need them,
+# importing this module only costs the standard library and NumPy
 
 
 def generate_clusters(max_num_clusters=10, points_per_cluster=200, std_dev=10):
@@ -35,6 +32,8 @@ def generate_clusters(max_num_clusters=10, points_per_cluster=200, std_dev=10):
 
 
 def plot_clusters(x, y):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(8, 6))
     plt.scatter(x, y)
     plt.title("2D Data Plot")
@@ -50,6 +49,8 @@ def find_clusters(X, n_clusters, rseed=2):
 
 
 def generate_tree(n):
+    from ete3 import Tree
+
     cell_names = [f"{random.choice(string.ascii_uppercase)}_cell-{i}" for i in range(n)]
 
     t = Tree()
@@ -72,6 +73,8 @@ def generate_tree(n):
 
 
 def write_msa_to_json_format(file_name):
+    from Bio import AlignIO
+
     alignment = AlignIO.read(open(file_name), "phylip")
     multiple_sequence_alignment_dictionary = []
     for record in alignment: